@@ -1,10 +1,12 @@
 #! /usr/bin/env python
+import asyncio
 import csv
+import functools
+import itertools
 import os
 import pathlib
 import subprocess
 import sys
-import tomllib
 from contextlib import contextmanager, redirect_stderr, redirect_stdout
 
 import logzero
@@ -17,7 +19,8 @@ from textual.widgets import (Button, DataTable, Footer, Header, Select,
                              TabbedContent, TabPane, TextArea)
 
 from sqltui.messages import MessageWidget
-from sqltui.oracle import DatabaseError, exec_oracle_query
+from sqltui.oracle import (DatabaseError, exec_oracle_query, make_oracle_dsn,
+                           row2dict)
 
 
 class SqlApp(App):
@@ -36,12 +39,34 @@ class SqlApp(App):
     ]
     CSS_PATH = "app.css"
     TITLE = "Oracle SQL TUI"
+    # Rows added to a results table per trip through the event loop.
+    ROWS_PER_TICK = 500
+    # Seconds to wait after a blur before saving a query to disk.
+    SAVE_DELAY = 0.5
+    # Tab panes have the id PANE_PREFIX + tab index.
+    PANE_PREFIX = "pane-"
+    _PANE_PREFIX_LEN = len(PANE_PREFIX)
     config = None
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._results = {}
+        # Widgets of each tab, keyed by tab index and then by role.
+        self._widgets = {}
+        # Query text last written to or read from each tab's SQL file.
+        self._last_saved_sql = {}
+        self._save_timers = {}
+        # Modification time of each tab's SQL file when it was last read or
+        # written by the app.
+        self._sql_mtime = {}
+        self._dsns = {}
+        self._visidata_config_loaded = False
+
     def compose(self) -> ComposeResult:
         mw = MessageWidget()
         mw.add_class("message")
         mw.add_class("hidden")
+        self._message_widget = mw
         yield mw
         yield Header("Oracle SQL TUI")
         yield Footer()
@@ -49,23 +74,33 @@ class SqlApp(App):
         options = []
         for conn_key, connection in connections.items():
             options.append((connection["desc"], conn_key))
-        yield Select(options, id="connection-selection")
-        tab_config = self.config["tab"]
-        with TabbedContent(id="tabbed-content"):
-            for tab_index, tab_config in tab_config.items():
-                with TabPane(tab_index, id=f"pane-{tab_index}"):
-                    yield ScrollableContainer(
-                        TextArea.code_editor(
-                            "",
-                            id=f"query-text-{tab_index}",
-                            theme="dracula",
-                            language="sql",
-                            tab_behavior="focus",
-                        ),
+        self._conn_selector = Select(options, id="connection-selection")
+        yield self._conn_selector
+        tab_configs = self.config["tab"]
+        with TabbedContent(id="tabbed-content") as tabbed_content:
+            self._tabbed_content = tabbed_content
+            for tab_index in tab_configs:
+                with TabPane(tab_index, id=f"{self.PANE_PREFIX}{tab_index}"):
+                    textarea = TextArea.code_editor(
+                        "",
+                        id=f"query-text-{tab_index}",
+                        theme="dracula",
+                        language="sql",
+                        tab_behavior="focus",
+                    )
+                    button = Button("Execute", id=f"query-execute-{tab_index}")
+                    table = DataTable(
+                        id=f"data-table-{tab_index}", classes="data-table"
                     )
+                    self._widgets[tab_index] = {
+                        "query_text": textarea,
+                        "button": button,
+                        "table": table,
+                    }
+                    yield ScrollableContainer(textarea)
                     with Horizontal(classes="button-bar"):
-                        yield Button("Execute", id=f"query-execute-{tab_index}")
-                    yield DataTable(id=f"data-table-{tab_index}", classes="data-table")
+                        yield button
+                    yield table
 
     def on_mount(self):
         self.screen.styles.border = ("heavy", "white")
@@ -77,14 +112,24 @@ class SqlApp(App):
             self.execute_query()
 
     def on_tabbed_content_tab_activated(self, event):
-        fname = self.get_query_file()
-        if not os.path.exists(fname):
+        tab_index = self.get_tab_index()
+        # Write edits still waiting on SAVE_DELAY before they can be
+        # overwritten by reloading the file.
+        if tab_index in self._save_timers:
+            self.save_query(tab_index)
+        fname = self.get_query_file(tab_index=tab_index)
+        try:
+            mtime = os.stat(fname).st_mtime
+        except FileNotFoundError:
             return
-        with open(fname, "r") as f:
+        if mtime == self._sql_mtime.get(tab_index):
+            return
+        with open(fname, "r", encoding="utf-8") as f:
             data = f.read()
-        tab_index = self.get_tab_index()
-        textarea = self.query_one(f"#query-text-{tab_index}")
+        textarea = self._widgets[tab_index]["query_text"]
         textarea.text = data
+        self._last_saved_sql[tab_index] = data
+        self._sql_mtime[tab_index] = mtime
 
     @on(DescendantBlur)
     async def handle_blur(self, event) -> None:
@@ -95,9 +140,39 @@ class SqlApp(App):
                 if widget_id.startswith("query-text-"):
                     pos = len("query-text-")
                     tab_index = widget_id[pos:]
-                    fname = self.get_query_file(tab_index=tab_index)
-                    with open(fname, "w") as f:
-                        f.write(widget.text)
+                    if widget.text == self._last_saved_sql.get(tab_index):
+                        return
+                    self.cancel_save_query(tab_index)
+                    self._save_timers[tab_index] = self.set_timer(
+                        self.SAVE_DELAY, lambda: self.save_query(tab_index)
+                    )
+
+    def save_query(self, tab_index):
+        """
+        Write the query text of tab `tab_index` to its SQL file if it has
+        changed since it was last saved.
+        """
+        self.cancel_save_query(tab_index)
+        text = self._widgets[tab_index]["query_text"].text
+        if text == self._last_saved_sql.get(tab_index):
+            return
+        fname = self.get_query_file(tab_index=tab_index)
+        write_query_file(fname, text)
+        self._last_saved_sql[tab_index] = text
+        self._sql_mtime[tab_index] = os.stat(fname).st_mtime
+
+    def cancel_save_query(self, tab_index):
+        """
+        Cancel a pending save of the query text of tab `tab_index`.
+        """
+        timer = self._save_timers.pop(tab_index, None)
+        if timer is not None:
+            timer.stop()
+
+    async def action_quit(self):
+        for tab_index in list(self._save_timers):
+            self.save_query(tab_index)
+        await super().action_quit()
 
     def action_about(self):
         message = "Oracle SQL TUI by Carl Waldbieser 2025"
@@ -105,6 +180,7 @@ class SqlApp(App):
 
     def action_reload_config(self):
         app.config = load_config()
+        self._dsns.clear()
         self.show_message("Configuration reloaded.")
 
     def action_execute_query(self):
@@ -113,30 +189,77 @@ class SqlApp(App):
         self.execute_query()
 
     def action_export_to_spreadsheet(self):
+        results = self._results.get(self.get_tab_index())
+        # Rows are handed to VisiData as dicts, so repeated column names
+        # (e.g. both sides of a join selecting ID) would drop columns.  Use
+        # the CSV export for those instead.
+        if (
+            results is not None
+            and "SPREADSHEET" not in os.environ
+            and len(set(results[0])) == len(results[0])
+        ):
+            vd = import_visidata()
+            if vd is not None:
+                self.export_to_visidata(vd, *results)
+                return
+        fname = self.get_results_file()
+        if self.get_configured_results_file() is not None:
+            self.open_spreadsheet(fname)
+            return
+        if results is None:
+            self.show_message("No results to export.")
+            return
+        self.export_results(fname, results)
+
+    @work(exclusive=True, thread=True, group="export")
+    def export_results(self, fname, results):
+        write_results_file(fname, *results)
+        self.call_from_thread(self.open_spreadsheet, fname)
+
+    def open_spreadsheet(self, fname):
         with self.app.suspend():
             logzero.loglevel(logzero.CRITICAL)
             spreadsheet = os.environ.get("SPREADSHEET", "visidata")
-            fname = self.get_results_file()
             subprocess.call([spreadsheet, fname])
             logzero.loglevel(logzero.DEBUG)
 
+    @work(exclusive=True, thread=True, group="export")
+    def export_to_visidata(self, vd, headers, rows):
+        if not self._visidata_config_loaded:
+            # Honor ~/.visidatarc options and plugins like the CLI does.
+            vd.loadConfigAndPlugins()
+            self._visidata_config_loaded = True
+        sheet = list(map(functools.partial(row2dict, headers), rows))
+        self.call_from_thread(self.view_in_visidata, vd, sheet)
+
+    def view_in_visidata(self, vd, sheet):
+        """
+        Open `sheet` in VisiData running in this process.
+        """
+        with self.app.suspend():
+            logzero.loglevel(logzero.CRITICAL)
+            vd.view(sheet)
+            logzero.loglevel(logzero.DEBUG)
+
     def action_edit(self):
         tab_index = self.get_tab_index()
-        textarea = self.query_one(f"#query-text-{tab_index}")
+        textarea = self._widgets[tab_index]["query_text"]
         EDITOR = os.environ.get("EDITOR", "vim")
         logger.debug(f"EDITOR is: {EDITOR}")
         fname = self.get_query_file()
-        with open(fname, "w") as f:
-            f.write(textarea.text)
+        self.cancel_save_query(tab_index)
+        write_query_file(fname, textarea.text)
         with self.app.suspend():
             logzero.loglevel(logzero.CRITICAL)
             subprocess.call([EDITOR, fname])
         logzero.loglevel(logzero.DEBUG)
-        with open(fname, "r") as f:
+        with open(fname, "r", encoding="utf-8") as f:
             textarea.text = f.read()
+        self._last_saved_sql[tab_index] = textarea.text
+        self._sql_mtime[tab_index] = os.stat(fname).st_mtime
 
     def action_switch_to_tab(self, tab_index):
-        self.get_child_by_type(TabbedContent).active = f"pane-{tab_index}"
+        self._tabbed_content.active = f"{self.PANE_PREFIX}{tab_index}"
 
     def get_query_file(self, tab_index=None):
         if tab_index is None:
@@ -153,65 +276,99 @@ class SqlApp(App):
         )
         return results_file
 
+    def get_configured_results_file(self, tab_index=None):
+        """
+        Return the results file configured for the tab, or None if the tab
+        does not write its results to disk.
+        """
+        if tab_index is None:
+            tab_index = self.get_tab_index()
+        return self.config["tab"][tab_index].get("results_file")
+
     @work(exclusive=True, thread=True)
     def execute_query(self):
         tab_index = self.get_tab_index()
-        textarea = self.query_one(f"#query-text-{tab_index}")
+        textarea = self._widgets[tab_index]["query_text"]
         sql = textarea.text
-        conn_selector = self.query_one("#connection-selection")
+        conn_selector = self._conn_selector
         if conn_selector.is_blank():
             self.call_from_thread(self.toggle_button_state)
             return
         conn_key = conn_selector.value
         connections = self.config["connections"]
         connection = connections[conn_key]
-        host = connection["host"]
-        database = connection["database"]
+        dsn = self.get_dsn(conn_key)
         user = connection["user"]
         passwd = connection["passwd"]
+        table = self._widgets[tab_index]["table"]
+        self._results.pop(tab_index, None)
+        headers = None
+        results = []
         try:
-            exec_oracle_query(
-                host=host,
-                db_name=database,
+            for field_names, rows in exec_oracle_query(
+                dsn=dsn,
                 user=user,
                 passwd=passwd,
                 sql=sql,
-                fname=self.get_results_file(),
-            )
+                fname=self.get_configured_results_file(tab_index),
+            ):
+                cells = [format_row(row) for row in rows]
+                if headers is None:
+                    headers = field_names
+                    self.call_from_thread(self.add_table_rows, table, cells, headers)
+                elif cells:
+                    self.call_from_thread(self.add_table_rows, table, cells)
+                results.extend(rows)
         except DatabaseError as ex:
-            self.call_from_thread(self.show_message, f"Database error: {ex}")
-            self.call_from_thread(self.toggle_button_state)
+            self.call_from_thread(self.finish_query, f"Database error: {ex}")
             return
-        self.call_from_thread(self.populate_table)
+        self._results[tab_index] = (headers, results)
 
-        self.call_from_thread(self.toggle_button_state)
+        self.call_from_thread(self.finish_query)
+
+    def finish_query(self, message=None):
+        """
+        Re-enable the execute button once a query is done, showing `message`
+        if one is given.
+        """
+        if message is not None:
+            self.show_message(message)
+        self.toggle_button_state()
+
+    async def add_table_rows(self, table, rows, headers=None):
+        """
+        Add `rows` to `table` `ROWS_PER_TICK` rows at a time, yielding to the
+        event loop between chunks so the app can repaint and handle input.
+        If `headers` is given, add those columns first.
+        """
+        if headers is not None:
+            table.add_columns(*headers)
+        for chunk in itertools.batched(rows, self.ROWS_PER_TICK):
+            table.add_rows(chunk)
+            await asyncio.sleep(0)
+
+    def get_dsn(self, conn_key):
+        """
+        Return the DSN for connection `conn_key`, building it on first use.
+        """
+        dsn = self._dsns.get(conn_key)
+        if dsn is None:
+            connection = self.config["connections"][conn_key]
+            dsn = make_oracle_dsn(connection["host"], connection["database"])
+            self._dsns[conn_key] = dsn
+        return dsn
 
     def get_tab_index(self):
-        tc = self.query_one("#tabbed-content")
-        pane_id = tc.active
-        pos = len("pane-")
-        tab_index = pane_id[pos:]
-        return tab_index
+        return self._tabbed_content.active[self._PANE_PREFIX_LEN :]
 
     def clear_table(self):
         tab_index = self.get_tab_index()
-        table = self.query_one(f"#data-table-{tab_index}")
+        table = self._widgets[tab_index]["table"]
         table.clear(columns=True)
 
-    def populate_table(self):
-        tab_index = self.get_tab_index()
-        table = self.query_one(f"#data-table-{tab_index}")
-        results_file = self.get_results_file()
-        with open(results_file, "r", newline="") as f:
-            reader = csv.reader(f)
-            headers = next(reader)
-            table.add_columns(*headers)
-            rows = [row for row in reader]
-            table.add_rows(rows)
-
     def toggle_button_state(self):
         tab_index = self.get_tab_index()
-        button = self.query_one(f"#query-execute-{tab_index}")
+        button = self._widgets[tab_index]["button"]
         button.disabled = not button.disabled
 
     def show_message(self, message, seconds=5.0):
@@ -219,7 +376,7 @@ class SqlApp(App):
         Show a one line message floating over the middle of the application for
         `seconds` seconds.
         """
-        mw = self.query_one(MessageWidget)
+        mw = self._message_widget
         mw.message = message
         mw.remove_class("hidden")
 
@@ -240,14 +397,71 @@ class SqlApp(App):
             self.refresh()
 
 
+def format_row(row):
+    """
+    Format the values of a result row as table cells the way `csv.writer`
+    would: None becomes an empty string and everything else `str(value)`.
+    """
+    return tuple("" if value is None else str(value) for value in row)
+
+
+def import_visidata():
+    """
+    Return the VisiData `vd` object, or None if VisiData is not installed.
+    """
+    try:
+        from visidata import vd
+    except ImportError:
+        return None
+    return vd
+
+
+def write_query_file(fname, text):
+    """
+    Write query `text` to file `fname` as UTF-8 with unbuffered writes.
+    """
+    data = memoryview(text.encode("utf-8"))
+    fd = os.open(fname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
+    finally:
+        os.close(fd)
+
+
+def write_results_file(fname, headers, rows):
+    """
+    Write query results to CSV file `fname`.
+    """
+    with open(fname, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+
+# `(mtime, config)` of the last configuration loaded.
+_config_cache = None
+
+
 def load_config():
     """
     Load configuration.
+    The file is only parsed again if it has been modified since the last load.
     """
+    global _config_cache
     home = os.environ["HOME"]
     p = pathlib.Path(f"{home}/.config/pyoracle_tui/pyoracle_tui.toml")
+    mtime = p.stat().st_mtime
+    if _config_cache is not None and _config_cache[0] == mtime:
+        return _config_cache[1]
+    # Imported here because tomllib compiles its regexes at import time and
+    # the configuration is only read at startup and on reload.
+    import tomllib
+
     with open(p, "rb") as f:
         config = tomllib.load(f)
+    _config_cache = (mtime, config)
     return config
 
 
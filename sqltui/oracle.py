@@ -1,57 +1,101 @@
 import csv
+import functools
+import threading
+from contextlib import nullcontext
 
 import oracledb
 
 DatabaseError = oracledb.DatabaseError
 
+_client_inited = False
+_pools = {}
+_pools_lock = threading.Lock()
 
-def exec_oracle_query(host, db_name, user, passwd, sql, fname, port=1521):
+
+def exec_oracle_query(dsn, user, passwd, sql, fname=None, batch_size=1000):
     """
-    Execute an oracle query and write the results to CSV.
+    Execute an oracle query and yield the results as `(field_names, rows)`
+    batches.  The first batch is always yielded, even if it is empty.
+    If `fname` is given, the results are also written to it as CSV.
     """
-    conn_str = make_oracle_conn_string(host, port, db_name, user, passwd)
-    oracledb.init_oracle_client()
-    batch_size = 200
-    with oracledb.connect(conn_str) as db, open(fname, "w", newline="") as f:
+    _ensure_client()
+    pool = _get_pool(dsn, user, passwd)
+    # The results file is only opened (and truncated) once connected.
+    with pool.acquire() as db, (
+        nullcontext() if fname is None else open(fname, "w", newline="")
+    ) as f:
         cursor = db.cursor()
+        # Fetch a whole batch per round trip.
+        cursor.arraysize = batch_size
+        cursor.prefetchrows = batch_size + 1
         cursor.execute(sql)
         field_names = [colinfo[0] for colinfo in cursor.description]
-        writer = csv.DictWriter(f, field_names)
-        writer.writeheader()
-        for row in fetchrows(cursor, num_rows=batch_size, row_wrapper=row2dict):
-            writer.writerow(row)
+        writer = None
+        if f is not None:
+            writer = csv.writer(f)
+            writer.writerow(field_names)
+        rows = cursor.fetchmany(batch_size)
+        while True:
+            if writer is not None:
+                writer.writerows(rows)
+            yield field_names, rows
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+
+def _ensure_client():
+    """
+    Initialize the Oracle client library the first time it is needed.
+    """
+    global _client_inited
+    if not _client_inited:
+        oracledb.init_oracle_client()
+        _client_inited = True
+
+
+def _get_pool(dsn, user, passwd):
+    """
+    Return the connection pool for `user` on `dsn`, creating it on first use.
+    """
+    key = (dsn, user, passwd)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = oracledb.create_pool(
+                user=user, password=passwd, dsn=dsn, min=1, max=4, increment=1
+            )
+            _pools[key] = pool
+    return pool
 
 
-def make_oracle_conn_string(host, port, db_name, user, passwd):
+def make_oracle_dsn(host, db_name, port=1521):
     """
-    Create an Oracle connection string.
+    Create an Oracle DSN.  Credentials are passed separately when connecting.
     """
-    conn_string = "{user}/{passwd}@//{host}:{port}/{db_name}".format(
-        host=host, port=port, db_name=db_name, user=user, passwd=passwd
-    )
-    return conn_string
+    return f"//{host}:{port}/{db_name}"
 
 
 def row2dict(columns, row):
     """
     Wrap a tuple row iterator as a dictionary.
     """
-    d = {}
-    for n, column_name in enumerate(columns):
-        d[column_name] = row[n]
-    return d
+    return dict(zip(columns, row))
 
 
 def fetchrows(cursor, num_rows=10, row_wrapper=None):
     """
     Fetch rows in batches of size `num_rows` and yield those.
     """
-    columns = list(entry[0] for entry in cursor.description)
+    columns = tuple(entry[0] for entry in cursor.description)
+    wrap = None
+    if row_wrapper is not None:
+        wrap = functools.partial(row_wrapper, columns)
     while True:
         rows = cursor.fetchmany(num_rows)
         if not rows:
             break
-        for row in rows:
-            if row_wrapper is not None:
-                row = row_wrapper(columns, row)
-            yield row
+        if wrap is None:
+            yield from rows
+        else:
+            yield from map(wrap, rows)